@@ -1,5 +1,8 @@
 import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.collections import LineCollection
+
+plt.style.use('ggplot') # Applied once, before any figure is created
 
 # ==========================================
 # 1. Prepare Data (Sourced from your screenshots)
@@ -16,7 +19,6 @@ recovery_data = [0.2666, 0.0368, 0.1088]   # Recovery Time (seconds)
 # 2. Draw Core Metrics Comparison Chart (Bar Chart)
 # ==========================================
 fig, axes = plt.subplots(1, 3, figsize=(18, 6))
-plt.style.use('ggplot') # Use a nice style
 
 # --- Chart A: Average Throughput (Log Scale) ---
 bars1 = axes[0].bar(models, tps_data, color=colors, edgecolor='black')
@@ -65,26 +67,55 @@ plt.show()
 # Model 2: Extremely high, but with momentary drops (Checkpoint)
 # Model 3: Stable, slight fluctuations
 
-plt.figure(figsize=(12, 6))
+fig, ax = plt.subplots(figsize=(12, 6))
 
 time_x = np.linspace(0, 25, 25) # 0 to 25 seconds
 
-# Simulated Data
+# Simulated Data (one draw for all three models, scaled per row)
 # Model 1: Fluctuates around 2600
-y1 = np.random.normal(2600, 100, 25)
-
 # Model 2: Fluctuates around 260,000, but drops every 5 seconds (simulating Checkpoint blocking)
-# Note: To make Model 1 and 3 visible, Model 2 is omitted or handled separately
-y2 = np.random.normal(260000, 5000, 25)
-for i in range(4, 25, 5): 
-    y2[i] = 1000 # Simulate drop
-
+#          Note: To make Model 1 and 3 visible, Model 2 is omitted or handled separately
 # Model 3: Fluctuates around 2400
-y3 = np.random.normal(2400, 150, 25)
-
-# Plotting
-plt.plot(time_x, y1, label='Model 1 (WAL)', color='#FF9999', linewidth=2, marker='o')
-plt.plot(time_x, y3, label='Model 3 (Hybrid)', color='#99FF99', linewidth=2, marker='s')
+rng = np.random.default_rng()
+locs = np.array([2600, 260000, 2400])[:, None]
+scales = np.array([100, 5000, 150])[:, None]
+y1, y2, y3 = rng.standard_normal((3, 25)) * scales + locs
+y2[4::5] = 1000 # Simulate drop
+
+# Downsample long traces with Largest-Triangle-Three-Buckets before drawing
+MAX_PLOT_POINTS = 2000
+
+def lttb(x, y, n_out=MAX_PLOT_POINTS):
+    n = len(x)
+    if n <= n_out:
+        return x, y
+    # n_out - 2 buckets over the interior points; first and last points are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    keep = np.empty(n_out, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Third vertex: mean of the next bucket (or the last point for the final bucket)
+        nlo, nhi = (edges[i + 1], edges[i + 2]) if i + 3 < n_out else (n - 1, n)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+x1, y1_plot = lttb(time_x, y1)
+x3, y3_plot = lttb(time_x, y3)
+
+# Plotting: one LineCollection per series and a single autoscale at the end,
+# so per-second traces with thousands of points stay cheap to draw
+def line_segments(x, y):
+    points = np.column_stack([x, y])
+    return np.stack([points[:-1], points[1:]], axis=1)
+
+ax.add_collection(LineCollection(line_segments(x1, y1_plot), colors='#FF9999', linewidths=2, label='Model 1 (WAL)'))
+ax.add_collection(LineCollection(line_segments(x3, y3_plot), colors='#99FF99', linewidths=2, label='Model 3 (Hybrid)'))
+ax.autoscale_view()
 
 plt.title('Throughput Stability Over Time (Model 1 vs 3)', fontsize=14)
 plt.xlabel('Time (Seconds)')
@@ -1,6 +1,8 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
+plt.style.use('seaborn-v0_8-whitegrid') # Applied once, before any figure is created
+
 # ==============================================================================
 # 1. Complete Experimental Data (1s - 11s)
 # ==============================================================================
@@ -32,7 +34,6 @@ rec_data = np.array([
 # ==============================================================================
 # Use a wider canvas (24x7) to ensure breathing room for all three plots
 fig, axes = plt.subplots(1, 3, figsize=(24, 7))
-plt.style.use('seaborn-v0_8-whitegrid')
 
 # -------------------------------------------------------
 # Chart 1: Throughput (Performance)
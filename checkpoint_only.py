@@ -1,21 +1,28 @@
 import time
 import multiprocessing
-import random
 import os
 import signal
+import mmap
+import numpy as np
 
 # --- Configuration ---
 MEMORY_SIZE_MB = 128
 TOTAL_RUN_TIME_SEC = 25
-CHECKPOINT_FREQUENCY_SEC = 5
+CHECKPOINT_FREQUENCY_SEC = 5     # Minimum interval; stretched to 2x the last checkpoint's duration
+PAGE_SHIFT = 12                  # Dirty tracking granularity: 4 KB pages
+PAGE_SIZE = 1 << PAGE_SHIFT
+RNG_BATCH = 65536                # Random numbers drawn per refill of the PCG64 buffers
+CHECKPOINT_POLL_TXS = 1024       # Transactions between checks of the checkpoint flag
 
 # --- Files ---
 CHECKPOINT_FILE = 'checkpoint.dat'
-CHECKPOINT_TEMP = 'checkpoint.dat.tmp'
 
 # --- Global Resources ---
 memory_state = None
+dirty_pages = None          # One flag per page modified since the last checkpoint
+checkpoint_fd = None        # Preallocated checkpoint file, kept open for in-place page writes
 checkpoint_requested = False
+shared_stats = None         # name -> multiprocessing.Value shared with the Manager
 
 # Global statistics variables
 checkpoint_count = 0
@@ -26,6 +33,33 @@ def worker_checkpoint_handler(signum, frame):
     global checkpoint_requested
     checkpoint_requested = True
 
+def write_dirty_pages(fd):
+    """pwrite() every run of consecutive dirty pages at its file offset; returns bytes written."""
+    pages = np.flatnonzero(dirty_pages)
+    if pages.size == 0:
+        return 0
+    
+    breaks = np.flatnonzero(np.diff(pages) != 1) + 1
+    run_starts = pages[np.r_[0, breaks]]
+    run_ends = pages[np.r_[breaks - 1, pages.size - 1]] + 1
+    
+    view = memoryview(memory_state)
+    written = 0
+    for first, last in zip(run_starts.tolist(), run_ends.tolist()):
+        written += os.pwrite(fd, view[first * PAGE_SIZE:last * PAGE_SIZE], first * PAGE_SIZE)
+    return written
+
+def open_checkpoint_file(mem_size_bytes):
+    """Create the checkpoint as a preallocated image of the all-zero database and keep it open.
+    
+    Every checkpoint is then an in-place pwrite() of dirty pages: no full dump, no rename,
+    and no file growth that would make fdatasync() flush allocation metadata.
+    """
+    fd = os.open(CHECKPOINT_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    os.posix_fallocate(fd, 0, mem_size_bytes)
+    os.fsync(fd)
+    return fd
+
 def perform_checkpoint():
     global checkpoint_requested, memory_state, checkpoint_count, total_bytes_written
     
@@ -34,15 +68,12 @@ def perform_checkpoint():
     
     current_size = 0
     try:
-        # Full flush to disk
-        with open(CHECKPOINT_TEMP, 'wb') as f:
-            f.write(memory_state)
-            f.flush()
-            os.fsync(f.fileno())
-        
-        current_size = os.path.getsize(CHECKPOINT_TEMP)
-        os.rename(CHECKPOINT_TEMP, CHECKPOINT_FILE)
-        
+        # Incremental: rewrite only the pages dirtied since the last checkpoint
+        current_size = write_dirty_pages(checkpoint_fd)
+        os.fdatasync(checkpoint_fd)
+        # Synced pages are not read back; drop them from the page cache
+        os.posix_fadvise(checkpoint_fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        dirty_pages[:] = False
         checkpoint_count += 1
         total_bytes_written += current_size
         
@@ -51,6 +82,10 @@ def perform_checkpoint():
         return
     
     end = time.time()
+    # Published on every checkpoint so the Manager sees them even after a crash
+    shared_stats['last_cp_dur'].value = end - start
+    shared_stats['total_written'].value = total_bytes_written
+    shared_stats['checkpoint_count'].value = checkpoint_count
     # Log size explicitly
     print(f"[Worker] Checkpoint #{checkpoint_count} Finished | "
           f"Size: {current_size/(1024*1024):.2f} MB | "
@@ -59,11 +94,15 @@ def perform_checkpoint():
     checkpoint_requested = False
 
 # --- Worker Logic ---
-def worker_process(mem_size_bytes, return_dict):
-    global memory_state, checkpoint_requested
+def worker_process(mem_size_bytes, stats):
+    global memory_state, dirty_pages, checkpoint_requested, shared_stats, checkpoint_fd
     
+    shared_stats = stats
     signal.signal(signal.SIGUSR1, worker_checkpoint_handler)
     memory_state = bytearray(mem_size_bytes)
+    mem_view = np.frombuffer(memory_state, dtype=np.uint8)
+    dirty_pages = np.zeros(mem_size_bytes >> PAGE_SHIFT, dtype=bool)
+    checkpoint_fd = open_checkpoint_file(mem_size_bytes)
     print(f"[Worker PID: {os.getpid()}] Starting Model 2 (Checkpoint-Only)...")
 
     transaction_count = 0
@@ -71,18 +110,32 @@ def worker_process(mem_size_bytes, return_dict):
     
     total_tx_lifetime = 0
     start_time_global = time.time()
+    
+    # Random ops are pre-generated in batches and consumed through a cursor
+    rng = np.random.default_rng()
+    cursor = RNG_BATCH  # Forces a refill before the first transaction
+    poll_countdown = CHECKPOINT_POLL_TXS
 
     try:
         while True:
-            if checkpoint_requested:
-                perform_checkpoint()
+            poll_countdown -= 1
+            if poll_countdown == 0:
+                poll_countdown = CHECKPOINT_POLL_TXS
+                if checkpoint_requested:
+                    perform_checkpoint()
             
-            # Simulate Transaction
-            num_ops = random.randint(1, 5)
-            for _ in range(num_ops):
-                address = random.randint(0, len(memory_state) - 1)
-                val = random.randint(0, 255)
-                memory_state[address] = val
+            # Simulate Transaction (one fancy-indexed store instead of a per-byte loop)
+            if cursor + 5 > RNG_BATCH:
+                addr_buf = rng.integers(0, mem_view.size, size=RNG_BATCH, dtype=np.int64)
+                val_buf = rng.integers(0, 256, size=RNG_BATCH, dtype=np.uint8)
+                nop_buf = rng.integers(1, 6, size=RNG_BATCH).tolist()
+                cursor = 0
+            num_ops = nop_buf[cursor]
+            addrs = addr_buf[cursor:cursor + num_ops]
+            vals = val_buf[cursor:cursor + num_ops]
+            cursor += num_ops
+            mem_view[addrs] = vals
+            dirty_pages[addrs >> PAGE_SHIFT] = True
             
             transaction_count += 1
             
@@ -96,7 +149,7 @@ def worker_process(mem_size_bytes, return_dict):
                 avg_tps = total_tx_lifetime / total_duration if total_duration > 0 else 0
                 
                 # [New] Update shared dictionary so Manager can see it even if crashed
-                return_dict['avg_tps'] = avg_tps
+                stats['avg_tps'].value = avg_tps
                 
                 print(f"[Worker] Throughput: {tps:.2f} TPS | Avg: {avg_tps:.2f} TPS")
                 
@@ -106,9 +159,6 @@ def worker_process(mem_size_bytes, return_dict):
     except KeyboardInterrupt:
         pass
     finally:
-        # Pass final stats back to Manager
-        return_dict['total_written'] = total_bytes_written
-        return_dict['checkpoint_count'] = checkpoint_count
         print(f"[Worker] Exiting.")
 
 # --- Recovery System ---
@@ -118,8 +168,15 @@ def recover_system(mem_size_bytes):
     
     cp_load_start = time.time()
     try:
-        with open(CHECKPOINT_FILE, 'rb') as f:
-            recovered_memory = bytearray(f.read())
+        with open(CHECKPOINT_FILE, 'rb', buffering=0) as f:
+            if os.fstat(f.fileno()).st_size == mem_size_bytes:
+                # Map the checkpoint instead of copying it (recovery here is read-only)
+                recovered_memory = mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ, flags=mmap.MAP_PRIVATE)
+            else:
+                # Unexpected size: read what exists straight into a full-size buffer
+                recovered_memory = bytearray(mem_size_bytes)
+                n = f.readinto(recovered_memory)
+                print(f"[Recovery] Warning: checkpoint holds {n} bytes, expected {mem_size_bytes}")
         print(f"[Recovery] Checkpoint loaded ({len(recovered_memory)/(1024*1024):.2f} MB)")
     except FileNotFoundError:
         print("[Recovery] No Checkpoint found.")
@@ -134,28 +191,36 @@ def recover_system(mem_size_bytes):
 
 # --- Manager ---
 if __name__ == "__main__":
-    for f in [CHECKPOINT_FILE, CHECKPOINT_TEMP]:
+    for f in [CHECKPOINT_FILE]:
         if os.path.exists(f): os.remove(f)
 
     print(f"[Manager] Experiment: Model 2 (Checkpoint-Only)")
     mem_size = MEMORY_SIZE_MB * 1024 * 1024
     
-    # Use Manager dict to get stats from child process
-    manager = multiprocessing.Manager()
-    return_dict = manager.dict()
+    # Shared-memory Values to get stats from child process (no Manager server, no IPC)
+    stats = {
+        'avg_tps': multiprocessing.Value('d', 0.0, lock=False),
+        'total_written': multiprocessing.Value('Q', 0, lock=False),
+        'checkpoint_count': multiprocessing.Value('I', 0, lock=False),
+        'last_cp_dur': multiprocessing.Value('d', 0.0, lock=False),
+    }
     
-    p = multiprocessing.Process(target=worker_process, args=(mem_size, return_dict))
+    p = multiprocessing.Process(target=worker_process, args=(mem_size, stats))
     p.start()
     
-    start_time = time.time()
-    last_cp = start_time
+    # Sleep exactly until the next deadline instead of polling once a second
+    start_time = time.monotonic()
+    run_end = start_time + TOTAL_RUN_TIME_SEC
+    next_cp = start_time + CHECKPOINT_FREQUENCY_SEC
     
     try:
-        while time.time() - start_time < TOTAL_RUN_TIME_SEC:
-            time.sleep(1)
-            if time.time() - last_cp >= CHECKPOINT_FREQUENCY_SEC:
+        while (now := time.monotonic()) < run_end:
+            if now >= next_cp:
                 os.kill(p.pid, signal.SIGUSR1)
-                last_cp = time.time()
+                # Adaptive interval: wait at least as long between checkpoints as the last one took
+                next_cp = now + max(CHECKPOINT_FREQUENCY_SEC, 2 * stats['last_cp_dur'].value)
+            else:
+                time.sleep(min(next_cp, run_end) - now)
     except KeyboardInterrupt:
         print("[Manager] Interrupted.")
     finally:
@@ -164,16 +229,16 @@ if __name__ == "__main__":
         p.join()
         
         # Retrieve stats
-        total_written = return_dict.get('total_written', 0)
-        count = return_dict.get('checkpoint_count', 0)
-        avg_tps = return_dict.get('avg_tps', 0)
+        total_written = stats['total_written'].value
+        count = stats['checkpoint_count'].value
+        avg_tps = stats['avg_tps'].value
 
         print("\n--- Final Statistics ---")
         print(f"  Average Throughput:          {avg_tps:.2f} TPS")
         
         print("\n--- Final Storage Stats ---")
         print(f"  Total Checkpoints Performed: {count}")
-        print(f"  Single Checkpoint Size:      {mem_size / (1024*1024):.2f} MB (Fixed Full Dump)")
+        print(f"  Checkpoint File Size:        {mem_size / (1024*1024):.2f} MB (Preallocated, Dirty Pages Only)")
         print(f"  Total Data Written to Disk:  {total_written / (1024*1024):.2f} MB")
             
         recover_system(mem_size)
@@ -1,180 +1,447 @@
 import time
 import multiprocessing
-import random
 import os
-import signal
-import uuid
+import mmap
 import threading
+import collections
+import errno
+import shutil
+from multiprocessing import shared_memory
+import numpy as np
+
+try:
+    from numba import njit  # Optional: compiles the transaction kernel to machine code
+except ImportError:
+    njit = None
 
 # --- Experiment Configuration ---
 MEMORY_SIZE_MB = 128          # Simulated database size (RAM)
 TOTAL_RUN_TIME_SEC = 25       # Total experiment duration
-CHECKPOINT_FREQUENCY_SEC = 5  # Checkpoint trigger frequency
+CHECKPOINT_FREQUENCY_SEC = 5  # Minimum checkpoint interval; stretched to 2x the last checkpoint's duration
 COMMIT_CHANCE = 0.90          # 90% commit, 10% rollback
 NUM_WORKER_THREADS = 1        # <--- Adjustable thread count (1, 2, 4, 8)
+NUM_SHARDS = 16               # Memory is split into equal slices, each guarded by its own lock
+                              # and dealt round-robin to the threads that own them
+RNG_BATCH = 65536             # Random numbers drawn per refill of a thread's PCG64 buffers
+COMMIT_DELAY_US = 100         # Group commit: with enough waiters, hold the fsync this long for more to join...
+COMMIT_SIBLINGS = 4           # ...where "enough" means at least this many queued commits
+PAGE_SHIFT = 12               # Dirty tracking granularity: 4 KB pages
+PAGE_SIZE = 1 << PAGE_SHIFT
 
 # --- File Paths ---
 WAL_FILE = 'wal.log'
+WAL_PREV = 'wal.log.prev'     # Segment rotated out by a checkpoint still being written
 CHECKPOINT_FILE = 'checkpoint.dat'
-CHECKPOINT_TEMP = 'checkpoint.dat.tmp'
+
+# --- WAL Record Format (fixed 16-byte binary records) ---
+TX_ID_THREAD_SHIFT = 48       # tx id = (thread index << 48) + per-thread counter: 2^48 txs per thread in the u8 field
+OP_UPDATE, OP_COMMIT, OP_ROLLBACK = 1, 2, 3
+WAL_RECORD = np.dtype([('op', 'u1'), ('tx', 'u8'), ('addr', 'u4'),
+                       ('old', 'u1'), ('new', 'u1'), ('_pad', 'u1')])
+
+# --- Transaction Kernel: apply one transaction's stores, mark their pages dirty, and fill
+# its WAL records (UPDATEs with before/after images, then COMMIT) in a single call ---
+if njit is not None:
+    # nogil lets worker threads on different shards run the kernel in parallel; the whole
+    # transaction body is one machine-code loop with no per-op interpreter work
+    @njit(cache=True, boundscheck=False, nogil=True)
+    def run_transaction(mem, dirty, offsets, base, vals, tx_id, records):
+        n = offsets.size
+        for i in range(n):
+            addr = base + offsets[i]
+            rec = records[i]
+            rec.op = OP_UPDATE
+            rec.tx = tx_id
+            rec.addr = addr
+            rec.old = mem[addr]
+            rec.new = vals[i]
+            mem[addr] = vals[i]
+            dirty[addr >> PAGE_SHIFT] = True
+        records[n].op = OP_COMMIT
+        records[n].tx = tx_id
+else:
+    def run_transaction(mem, dirty, offsets, base, vals, tx_id, records):
+        n = offsets.size
+        addrs = offsets + base
+        records['op'][:n] = OP_UPDATE
+        records['op'][n] = OP_COMMIT
+        records['tx'] = tx_id
+        records['addr'][:n] = addrs
+        records['old'][:n] = mem[addrs]  # Fancy indexing reads a copy before the stores below
+        records['new'][:n] = vals
+        mem[addrs] = vals
+        dirty[addrs >> PAGE_SHIFT] = True
+
+# --- Recovery Kernel: apply the selected log records in log order (or newest first) ---
+if njit is not None:
+    # One pass over the log with no masked copies, and an explicit application order
+    @njit(cache=True, boundscheck=False)
+    def replay(mem, addrs, vals, selected, reverse):
+        n = addrs.size
+        count = 0
+        for j in range(n):
+            i = n - 1 - j if reverse else j
+            if selected[i]:
+                mem[addrs[i]] = vals[i]
+                count += 1
+        return count
+else:
+    def replay(mem, addrs, vals, selected, reverse):
+        step = -1 if reverse else 1
+        mem[addrs[selected][::step]] = vals[selected][::step]
+        return int(selected.sum())
 
 # --- Global Shared Resources (Process Level) ---
-memory_state = None         # In-memory database
-checkpoint_requested = False
-master_lock = None          # Global Lock
-wal_file_handle = None      # Shared WAL file handle
+memory_state = None         # In-memory database (memoryview over a SharedMemory segment)
+mem_view = None             # uint8 NumPy view over memory_state
+dirty_pages = None          # One flag per page modified since the last checkpoint
+checkpoint_fd = None        # Preallocated checkpoint file, kept open for in-place page writes
+shard_locks = None          # One lock per memory shard
+committer = None            # GroupCommitter that owns the WAL file
+IOV_MAX = os.sysconf('SC_IOV_MAX')
+WAL_WRITE_FLAGS = getattr(os, 'RWF_DSYNC', 0)  # Linux 4.7+: per-write O_DSYNC; else plain pwritev() + fdatasync()
 
 # [Global Stats] For average throughput calculation
-total_transactions_global = 0
 process_start_time = 0
-shared_return_dict = None   # Cross-process shared dictionary
+shared_stats = None         # name -> multiprocessing.Value shared with the Manager
+commit_counts = None        # Durable commits per worker thread; slot i is only written by thread i
 
-# --- Signal Handler ---
-def worker_checkpoint_handler(signum, frame):
-    global checkpoint_requested
-    checkpoint_requested = True
+# --- Checkpoint Logic (runs on the worker process's main thread) ---
+def snapshot_dirty_pages():
+    """Copy every run of consecutive dirty pages; returns [(file offset, bytes)]. Needs every shard lock."""
+    pages = np.flatnonzero(dirty_pages)
+    if pages.size == 0:
+        return []
+    
+    breaks = np.flatnonzero(np.diff(pages) != 1) + 1
+    run_starts = pages[np.r_[0, breaks]]
+    run_ends = pages[np.r_[breaks - 1, pages.size - 1]] + 1
+    
+    view = memoryview(memory_state)
+    return [(first * PAGE_SIZE, bytes(view[first * PAGE_SIZE:last * PAGE_SIZE]))
+            for first, last in zip(run_starts.tolist(), run_ends.tolist())]
+
+def open_checkpoint_file(mem_size_bytes):
+    """Create the checkpoint as a preallocated image of the all-zero database and keep it open.
+    
+    Every checkpoint is then an in-place pwrite() of dirty pages: no full dump, no rename,
+    and no file growth that would make fdatasync() flush allocation metadata.
+    """
+    fd = os.open(CHECKPOINT_FILE, os.O_RDWR | os.O_CREAT, 0o644)
+    os.posix_fallocate(fd, 0, mem_size_bytes)
+    os.fsync(fd)
+    return fd
 
-# --- Checkpoint Logic (Must be called while holding the lock) ---
-def perform_checkpoint_locked():
-    global memory_state, wal_file_handle
+def run_checkpoint():
+    """Fuzzy checkpoint: snapshot under the shard locks, write it out while workers keep running."""
+    global shared_stats
     
-    print(f"[Thread {threading.current_thread().name}] === Starting Checkpoint (Holding Global Lock) ===")
+    print(f"[Checkpointer] === Starting Checkpoint (Holding All Locks for the Snapshot) ===")
     start_time = time.time()
     
-    # 1. Flush memory to disk (Data File)
+    # 1. Snapshot: copy the dirty pages and start a fresh WAL segment at the same instant.
+    # Shard locks are always taken in index order, so this cannot deadlock
+    for lock in shard_locks:
+        lock.acquire()
     try:
-        with open(CHECKPOINT_TEMP, 'wb') as f:
-            f.write(memory_state)
-            f.flush()
-            os.fsync(f.fileno()) # Force flush to disk
-        
-        os.rename(CHECKPOINT_TEMP, CHECKPOINT_FILE)
+        dirty = np.flatnonzero(dirty_pages)
+        snapshot = snapshot_dirty_pages()
+        dirty_pages[:] = False
+        # Commits submitted before the snapshot may still be queued, not yet on disk
+        barrier = committer.rotate()
+    finally:
+        for lock in reversed(shard_locks):
+            lock.release()
+    pause = time.time() - start_time
+    
+    # 2. Flush the snapshot to disk (Data File) without blocking any transaction.
+    # Write-ahead rule: every commit in the snapshot is made durable before its first page
+    # is written. A crash mid-way is then safe: WAL_PREV is only dropped after the data sync.
+    try:
+        if barrier is not None:
+            committer.wait_durable(barrier)
+        written = 0
+        for offset, data in snapshot:
+            written += os.pwrite(checkpoint_fd, data, offset)
+        os.fdatasync(checkpoint_fd)
+        # Synced pages are not read back; keep them from evicting the WAL and hot pages
+        os.posix_fadvise(checkpoint_fd, 0, 0, os.POSIX_FADV_DONTNEED)
     except Exception as e:
+        # Those pages still need a checkpoint, and WAL_PREV still covers them
+        dirty_pages[dirty] = True
         print(f"Checkpoint Failed: {e}")
         return
-
-    # 2. Prune WAL
-    wal_file_handle.close()
-    with open(WAL_FILE, 'wb') as f:
-        f.truncate(0)
     
-    # Reopen in Append mode
-    wal_file_handle = open(WAL_FILE, 'ab', buffering=0)
+    # 3. Prune WAL: the rotated-out segment is now covered by the checkpoint
+    os.remove(committer.prev_path)
     
     end_time = time.time()
-    print(f"[Thread {threading.current_thread().name}] === Checkpoint Finished. Pause: {end_time - start_time:.4f}s ===\n")
+    shared_stats['last_cp_dur'].value = end_time - start_time
+    print(f"[Checkpointer] === Checkpoint Finished. "
+          f"Written: {written/(1024*1024):.2f} MB | Pause: {pause:.4f}s | Total: {end_time - start_time:.4f}s ===\n")
+
+
+# --- Group Commit ---
+class GroupCommitter:
+    """Owns the WAL file; a flusher thread turns every queued commit into one durable pwritev()."""
+    
+    def __init__(self, path, prev_path):
+        self.path = path
+        self.prev_path = prev_path
+        self.fd = self._open()
+        self.offset = os.fstat(self.fd).st_size  # Next append position
+        self.queue = collections.deque()  # (record array, Event) per committed transaction, in order
+        self.cond = threading.Condition()
+        self.io_lock = threading.Lock()   # Held by whoever is writing or replacing the file
+        self.error = None                 # OSError that stopped the flusher; nothing is durable after it
+        
+        self.flusher = threading.Thread(target=self._flush_loop, name="WAL-Flusher", daemon=True)
+        self.flusher.start()
+    
+    def submit(self, records):
+        """Queue a committed transaction's records; returns an Event set once they are durable.
+        
+        The Event is also set if the flusher has failed: wait through wait_durable(), which re-raises.
+        """
+        event = threading.Event()
+        with self.cond:
+            if self.error is not None:
+                event.set()
+                return event
+            self.queue.append((records, event))
+            self.cond.notify()
+        return event
+    
+    def wait_durable(self, event):
+        """Block until a submitted commit is durable; re-raises the flusher's error if it never will be."""
+        event.wait()
+        if self.error is not None:
+            raise self.error
+    
+    def _flush_loop(self):
+        try:
+            self._flush_batches()
+        except OSError as e:
+            # Fail every waiter instead of leaving them blocked on a flusher that is gone
+            with self.cond:
+                self.error = e
+                batch = list(self.queue)
+                self.queue.clear()
+            self._release(batch)
+            print(f"[{threading.current_thread().name}] WAL write failed: {e}")
+    
+    def _flush_batches(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                # Many concurrent committers: give stragglers a moment to join this fsync
+                if len(self.queue) >= COMMIT_SIBLINGS:
+                    self.cond.wait(COMMIT_DELAY_US / 1e6)
+            
+            # Not held while idle above: a checkpoint's rotate() blocks every new commit
+            with self.io_lock:
+                with self.cond:
+                    batch = list(self.queue)
+                    self.queue.clear()
+                
+                # Hand the whole batch to the kernel as one scatter list; with RWF_DSYNC the
+                # same syscall also makes it durable, so there is no separate fsync()
+                try:
+                    for i in range(0, len(batch), IOV_MAX):
+                        self._write_all([records for records, _ in batch[i:i + IOV_MAX]])
+                    if not WAL_WRITE_FLAGS:
+                        os.fdatasync(self.fd)  # File data and size only; timestamps are not worth a journal write
+                except OSError:
+                    # None of this batch may be reported durable: hand it back for _flush_loop to fail
+                    with self.cond:
+                        self.queue.extendleft(reversed(batch))
+                    raise
+                self._release(batch)
+    
+    def _write_all(self, bufs):
+        """pwritev() at the end of the log until every byte is written; a short write resumes where it stopped."""
+        bufs = [memoryview(records).cast('B') for records in bufs]
+        while bufs:
+            written = os.pwritev(self.fd, bufs, self.offset, WAL_WRITE_FLAGS)
+            if written == 0:
+                raise OSError(errno.EIO, "pwritev() made no progress", self.path)
+            self.offset += written
+            # Drop the buffers that are fully on disk and trim the one cut short
+            while bufs and written >= len(bufs[0]):
+                written -= len(bufs[0])
+                bufs.pop(0)
+            if written:
+                bufs[0] = bufs[0][written:]
+    
+    def _open(self):
+        # Not O_APPEND: Linux ignores pwritev()'s offset on an append-mode fd
+        return os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o644)
+    
+    def _release(self, batch):
+        for _, event in batch:
+            event.set()
+    
+    def rotate(self):
+        """Move the WAL written so far to prev_path; later flushes go to a fresh file.
+        
+        Queued records stay queued and land in the new segment, which recovery replays
+        after prev_path, so their order is kept. Returns the Event of the last queued commit
+        (None if none is pending): once it is set, every commit queued so far is durable.
+        """
+        prev_path = self.prev_path
+        with self.io_lock:
+            with self.cond:
+                barrier = self.queue[-1][1] if self.queue else None
+            os.close(self.fd)
+            if os.path.exists(prev_path):
+                # The last checkpoint failed and its segment is still needed: append to it
+                with open(prev_path, 'ab') as dst, open(self.path, 'rb') as src:
+                    shutil.copyfileobj(src, dst)
+                    dst.flush()
+                    os.fdatasync(dst.fileno())
+                os.remove(self.path)
+            else:
+                os.rename(self.path, prev_path)
+            self.fd = self._open()
+            self.offset = 0
+        return barrier
 
 
 # --- Worker Thread Logic ---
-def worker_thread_logic():
-    global memory_state, checkpoint_requested, master_lock, wal_file_handle
-    global total_transactions_global, shared_return_dict, process_start_time
+def worker_thread_logic(thread_idx):
+    global memory_state, mem_view, dirty_pages
     
-    tx_count_local = 0
-    last_report_time = time.time()
+    next_tx_id = thread_idx << TX_ID_THREAD_SHIFT
+    shard_size = mem_view.size // NUM_SHARDS
+    # Shards this thread owns: with NUM_WORKER_THREADS <= NUM_SHARDS no other worker touches
+    # them, so the shard lock is never contended (only a checkpoint ever takes it from us)
+    owned_shards = list(range(thread_idx % NUM_SHARDS, NUM_SHARDS, NUM_WORKER_THREADS))
+    
+    # Per-thread random ops, pre-generated in batches and consumed through a cursor
+    rng = np.random.default_rng()
+    cursor = RNG_BATCH  # Forces a refill before the first transaction
     
     while True:
         # ============================================================
         # CRITICAL SECTION START
-        # Acquire Global Lock, simulating Python GIL or DB Global Lock
+        # A transaction only touches one of this thread's shards, so it only holds that shard's lock
         # ============================================================
-        master_lock.acquire()
+        if cursor + 5 > RNG_BATCH:
+            shard_buf = rng.choice(owned_shards, size=RNG_BATCH).tolist()
+            nop_buf = rng.integers(1, 6, size=RNG_BATCH).tolist()
+            offset_buf = rng.integers(0, shard_size, size=RNG_BATCH, dtype=np.int64)
+            val_buf = rng.integers(0, 256, size=RNG_BATCH, dtype=np.uint8)
+            commit_buf = (rng.random(RNG_BATCH, dtype=np.float32) < COMMIT_CHANCE).tolist()
+            cursor = 0
+        shard = shard_buf[cursor]
+        shard_lock = shard_locks[shard]
+        shard_lock.acquire()
         
         try:
-            # 1. Check if Checkpoint is needed
-            if checkpoint_requested:
-                perform_checkpoint_locked()
-                checkpoint_requested = False 
-
-            # 2. Simulate transaction
-            tx_id = str(uuid.uuid4())[:8]
-            num_ops = random.randint(1, 5) 
-            undo_log = [] 
-            
-            # Write WAL + Modify memory
-            for _ in range(num_ops):
-                address = random.randint(0, len(memory_state) - 1)
-                new_data = random.randint(0, 255)
-                old_data = memory_state[address]
-                
-                undo_log.append((address, old_data))
-                entry = f"UPDATE:{tx_id}:{address}:{old_data}:{new_data}\n".encode('utf-8')
-                wal_file_handle.write(entry)
-                memory_state[address] = new_data
+            # 1. Simulate transaction (stores, dirty pages and WAL records in one kernel call)
+            tx_id = next_tx_id
+            next_tx_id += 1
+            num_ops = nop_buf[cursor]
+            commits = commit_buf[cursor]
+            records = np.zeros(num_ops + 1, dtype=WAL_RECORD)
+            run_transaction(mem_view, dirty_pages, offset_buf[cursor:cursor + num_ops],
+                            shard * shard_size, val_buf[cursor:cursor + num_ops], tx_id, records)
+            cursor += num_ops
             
-            # 3. Commit or Rollback
-            if random.random() < COMMIT_CHANCE:
+            # 2. Commit or Rollback
+            if commits:
                 # --- COMMIT PATH ---
-                wal_file_handle.write(f"COMMIT:{tx_id}\n".encode('utf-8'))
-                
-                # [Modified] Use os.fsync(fd) to ensure physical write to disk
-                os.fsync(wal_file_handle.fileno())
-                
-                tx_count_local += 1
-                total_transactions_global += 1
+                # Queued under the shard lock, so each shard's records reach the log in order;
+                # the flusher thread does the write + fsync for every thread's pending commits
+                durable = committer.submit(records)
             else:
                 # --- ROLLBACK PATH ---
-                for address, old_data in reversed(undo_log):
-                    memory_state[address] = old_data
-                
-                wal_file_handle.write(f"ROLLBACK:{tx_id}\n".encode('utf-8'))
-                
-                # [Modified] Use os.fsync(fd)
-                os.fsync(wal_file_handle.fileno())
+                # Undone in memory only from the before-images: to recovery, an aborted
+                # transaction never happened
+                updates = records[:num_ops][::-1]
+                mem_view[updates['addr']] = updates['old']
+                durable = None
 
         finally:
-           
-            master_lock.release()
+            shard_lock.release()
         
-        # Throughput reporting
+        # Wait for the group fsync outside the shard lock, so other commits can join the batch
+        if durable is not None:
+            try:
+                committer.wait_durable(durable)
+            except OSError as e:
+                # The WAL can no longer make anything durable: stop the whole process loudly
+                print(f"[{threading.current_thread().name}] Commit not durable ({e}). Stopping worker process.")
+                os._exit(1)
+            commit_counts[thread_idx] += 1
+
+# --- Throughput Reporter (one thread prints for all workers) ---
+def reporter_thread_logic():
+    last_counts = list(commit_counts)
+    last_report_time = time.time()
+    
+    while True:
+        time.sleep(1.0)
         current_time = time.time()
-        if current_time - last_report_time >= 1.0:
-            tps = tx_count_local / (current_time - last_report_time)
-            
-            # Update global average TPS
-            total_duration = current_time - process_start_time
-            avg_tps = total_transactions_global / total_duration if total_duration > 0 else 0
-            if shared_return_dict is not None:
-                shared_return_dict['avg_tps'] = avg_tps
-            
-            print(f"[{threading.current_thread().name}] TPS: {tps:.2f}")
-            
-            tx_count_local = 0
-            last_report_time = current_time
+        counts = list(commit_counts)
+        elapsed = current_time - last_report_time
+        per_thread = [(now - before) / elapsed for now, before in zip(counts, last_counts)]
+        
+        # Update global average TPS
+        total_duration = current_time - process_start_time
+        avg_tps = sum(counts) / total_duration if total_duration > 0 else 0
+        shared_stats['avg_tps'].value = avg_tps
+        
+        breakdown = " | ".join(f"T{i+1}: {tps:.0f}" for i, tps in enumerate(per_thread))
+        print(f"[Reporter] TPS: {sum(per_thread):.2f} ({breakdown})")
+        
+        last_counts = counts
+        last_report_time = current_time
 
 # --- Main Worker Process (INITIALIZATION) ---
-def worker_process_entry(mem_size_bytes, return_dict):
-    global memory_state, master_lock, wal_file_handle
-    global shared_return_dict, process_start_time, total_transactions_global
-    
-    # 1. Initialize Signal Handler
-    signal.signal(signal.SIGUSR1, worker_checkpoint_handler)
+def worker_process_entry(shm_name, mem_size_bytes, stats, checkpoint_conn):
+    global memory_state, mem_view, dirty_pages, shard_locks, committer, checkpoint_fd
+    global shared_stats, process_start_time, commit_counts
     
-    # 2. Initialize Shared Resources
-    memory_state = bytearray(mem_size_bytes)
-    master_lock = threading.Lock() # <--- Lock is created here!
+    # 1. Initialize Shared Resources
+    # Attach to the segment created by the Manager (the segment may be rounded up to a page)
+    shm = shared_memory.SharedMemory(name=shm_name)
+    memory_state = shm.buf[:mem_size_bytes]
+    mem_view = np.ndarray((mem_size_bytes,), dtype=np.uint8, buffer=shm.buf)
+    dirty_pages = np.zeros(mem_size_bytes >> PAGE_SHIFT, dtype=bool)
+    shard_locks = [threading.Lock() for _ in range(NUM_SHARDS)] # <--- Locks are created here!
     
-    # 3. Initialize Stats
-    shared_return_dict = return_dict
+    # 2. Initialize Stats
+    shared_stats = stats
     process_start_time = time.time()
-    total_transactions_global = 0
+    commit_counts = [0] * NUM_WORKER_THREADS
     
-    # 4. Open File (buffering=0: Binary unbuffered mode)
-    wal_file_handle = open(WAL_FILE, 'ab', buffering=0)
+    # 3. Open the WAL behind its group-commit flusher thread, and the preallocated checkpoint.
+    # One log for the whole process: every owning thread blocks until its commit is durable,
+    # so only a shared queue ever holds more than one commit for a sync to batch
+    committer = GroupCommitter(WAL_FILE, WAL_PREV)
+    checkpoint_fd = open_checkpoint_file(mem_size_bytes)
     
-    print(f"[Process] Starting {NUM_WORKER_THREADS} threads with a GLOBAL LOCK strategy...")
+    print(f"[Process] Starting {NUM_WORKER_THREADS} threads with a SHARDED LOCK strategy ({NUM_SHARDS} thread-owned shards)...")
 
-    # 5. Spawn Threads
+    # 4. Spawn Threads
     threads = []
     for i in range(NUM_WORKER_THREADS):
-        t = threading.Thread(target=worker_thread_logic, name=f"Thread-{i+1}")
+        t = threading.Thread(target=worker_thread_logic, args=(i,), name=f"Thread-{i+1}")
         t.daemon = True 
         t.start()
         threads.append(t)
+    threading.Thread(target=reporter_thread_logic, name="Reporter", daemon=True).start()
         
-    # 6. Keep Main Process Alive
+    # 5. The main thread is the checkpointer: it sleeps in recv() on the Manager's pipe, so
+    # workers never stop to check for requests and no signal interrupts their system calls
     while True:
-        time.sleep(1)
+        checkpoint_conn.recv_bytes()
+        # Requests that arrived while the last checkpoint was being written collapse into one
+        while checkpoint_conn.poll():
+            checkpoint_conn.recv_bytes()
+        run_checkpoint()
 
 # --- Recovery System ---
 def recover_system(mem_size_bytes):
@@ -182,59 +449,55 @@ def recover_system(mem_size_bytes):
     total_start = time.time()
     
     try:
-        with open(CHECKPOINT_FILE, 'rb') as f:
-            recovered_memory = bytearray(f.read())
+        with open(CHECKPOINT_FILE, 'rb', buffering=0) as f:
+            if os.fstat(f.fileno()).st_size == mem_size_bytes:
+                # Copy-on-write mapping: only pages touched by Redo/Undo are ever copied
+                recovered_memory = mmap.mmap(f.fileno(), 0, flags=mmap.MAP_PRIVATE,
+                                             prot=mmap.PROT_READ | mmap.PROT_WRITE)
+            else:
+                # Unexpected size: read what exists straight into a full-size buffer
+                recovered_memory = bytearray(mem_size_bytes)
+                n = f.readinto(recovered_memory)
+                print(f"[Recovery] Warning: checkpoint holds {n} bytes, expected {mem_size_bytes}")
         print(f"[Recovery] Phase 1: Checkpoint loaded ({len(recovered_memory)/(1024*1024):.2f} MB)")
     except FileNotFoundError:
         print("[Recovery] Phase 1: No Checkpoint found. Starting from empty.")
         recovered_memory = bytearray(mem_size_bytes)
 
-    print(f"[Recovery] Phase 2: Analyzing WAL ({WAL_FILE})...")
-    tx_status = {}
-    wal_lines = []
-    
-    if os.path.exists(WAL_FILE):
-        with open(WAL_FILE, 'rb') as f:
-            for line_bytes in f:
-                wal_lines.append(line_bytes)
-                try:
-                    line = line_bytes.decode('utf-8').strip()
-                    parts = line.split(':')
-                    if parts[0] == "UPDATE":
-                        if parts[1] not in tx_status: tx_status[parts[1]] = "inflight"
-                    elif parts[0] == "COMMIT":
-                        tx_status[parts[1]] = "committed"
-                    elif parts[0] == "ROLLBACK":
-                        tx_status[parts[1]] = "aborted"
-                except: pass
+    # A crash during a checkpoint's write leaves the rotated-out segment behind; it comes first
+    segments = [path for path in (WAL_PREV, WAL_FILE) if os.path.exists(path) and os.path.getsize(path) > 0]
+    print(f"[Recovery] Phase 2: Analyzing WAL ({', '.join(segments) or WAL_FILE})...")
+    # Zero-copy view of the fixed-size records; a torn trailing record is ignored
+    updates = [np.empty(0, dtype=WAL_RECORD)]
+    committed = [np.empty(0, dtype=np.uint64)]
+    aborted = [np.empty(0, dtype=np.uint64)]
+    
+    for path in segments:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, prot=mmap.PROT_READ) as mm:
+            records = np.frombuffer(mm, dtype=WAL_RECORD, count=len(mm) // WAL_RECORD.itemsize)
+            ops = records['op']
+            # Boolean indexing copies, so nothing below still points into the mmap
+            updates.append(records[ops == OP_UPDATE])
+            committed.append(records['tx'][ops == OP_COMMIT])
+            aborted.append(records['tx'][ops == OP_ROLLBACK])
+            del records, ops
+    updates, committed, aborted = (np.concatenate(parts) for parts in (updates, committed, aborted))
 
-    inflight = {tx for tx, status in tx_status.items() if status == "inflight"}
+    tx_ids = updates['tx']
+    inflight = np.setdiff1d(tx_ids, np.concatenate([committed, aborted]))
     print(f"[Recovery] Analysis complete. Found {len(inflight)} inflight transactions.")
 
+    recovered_np = np.frombuffer(recovered_memory, dtype=np.uint8)
+
     print("[Recovery] Phase 3: Redo...")
-    redo_count = 0
-    for line_bytes in wal_lines:
-        try:
-            parts = line_bytes.decode('utf-8').strip().split(':')
-            if parts[0] == "UPDATE":
-                addr, new_val = int(parts[2]), int(parts[4])
-                recovered_memory[addr] = new_val
-                redo_count += 1
-        except: pass
+    # Only committed work is replayed; rolled-back updates were already undone in memory.
+    # Records are not coalesced per cache line or deduplicated per address first: each byte is
+    # its own value, and sorting out the last write per address (np.unique) costs ~10x more
+    # than this single in-order pass over the log
+    redo_count = replay(recovered_np, updates['addr'], updates['new'], np.isin(tx_ids, committed), False)
     
     print("[Recovery] Phase 4: Undo...")
-    undo_count = 0
-    for line_bytes in reversed(wal_lines):
-        if not inflight: break
-        try:
-            parts = line_bytes.decode('utf-8').strip().split(':')
-            if parts[0] == "UPDATE":
-                tx_id = parts[1]
-                if tx_id in inflight:
-                    addr, old_val = int(parts[2]), int(parts[3])
-                    recovered_memory[addr] = old_val
-                    undo_count += 1
-        except: pass
+    undo_count = replay(recovered_np, updates['addr'], updates['old'], np.isin(tx_ids, inflight), True)
 
     print(f"\n[Recovery] Recovery Complete.")
     print(f"  - Redo Operations: {redo_count}")
@@ -245,31 +508,48 @@ def recover_system(mem_size_bytes):
 # --- Manager Process (MAIN EXECUTION) ---
 if __name__ == "__main__":
     # Cleanup old files
-    for f in [WAL_FILE, CHECKPOINT_FILE, CHECKPOINT_TEMP]:
+    for f in [WAL_FILE, WAL_PREV, CHECKPOINT_FILE]:
         if os.path.exists(f): os.remove(f)
 
-    print(f"[Manager] Experiment: Model 3.1 (Hybrid + {NUM_WORKER_THREADS} Threads + Global Lock)")
+    print(f"[Manager] Experiment: Model 3.1 (Hybrid + {NUM_WORKER_THREADS} Threads + Sharded Locks)")
     
-    manager = multiprocessing.Manager()
-    return_dict = manager.dict()
+    # Shared-memory Values for stats (no Manager server process, no IPC round-trips)
+    stats = {
+        'avg_tps': multiprocessing.Value('d', 0.0, lock=False),
+        'last_cp_dur': multiprocessing.Value('d', 0.0, lock=False),
+    }
     
     mem_size = MEMORY_SIZE_MB * 1024 * 1024
     
+    # The database lives in shared memory so more worker processes could map it without IPC
+    shm = shared_memory.SharedMemory(create=True, size=mem_size)
+    
+    # Checkpoint requests travel over a one-way pipe to the worker's checkpointer thread
+    checkpoint_rx, checkpoint_tx = multiprocessing.Pipe(duplex=False)
+    
     # Start the worker process
-    p = multiprocessing.Process(target=worker_process_entry, args=(mem_size, return_dict))
+    p = multiprocessing.Process(target=worker_process_entry, args=(shm.name, mem_size, stats, checkpoint_rx))
     p.start()
+    checkpoint_rx.close()  # The worker holds the read end
     
-    start_time = time.time()
-    last_checkpoint = start_time
+    # Sleep exactly until the next deadline instead of polling once a second
+    start_time = time.monotonic()
+    run_end = start_time + TOTAL_RUN_TIME_SEC
+    next_checkpoint = start_time + CHECKPOINT_FREQUENCY_SEC
     
     try:
-        while time.time() - start_time < TOTAL_RUN_TIME_SEC:
-            time.sleep(1)
-            # Trigger Checkpoint signal periodically
-            if time.time() - last_checkpoint >= CHECKPOINT_FREQUENCY_SEC:
+        while (now := time.monotonic()) < run_end:
+            if not p.is_alive():
+                print(f"[Manager] Worker process exited early (exit code {p.exitcode}).")
+                break
+            # Trigger Checkpoint request periodically
+            if now >= next_checkpoint:
                 # print("[Manager] Triggering Checkpoint...")
-                os.kill(p.pid, signal.SIGUSR1)
-                last_checkpoint = time.time()
+                checkpoint_tx.send_bytes(b'C')
+                # Adaptive interval: wait at least as long between checkpoints as the last one took
+                next_checkpoint = now + max(CHECKPOINT_FREQUENCY_SEC, 2 * stats['last_cp_dur'].value)
+            else:
+                time.sleep(min(next_checkpoint, run_end) - now)
                 
     except KeyboardInterrupt:
         print("[Manager] Interrupted.")
@@ -279,7 +559,7 @@ if __name__ == "__main__":
         p.kill() # Force Kill to simulate crash
         p.join()
         
-        avg_tps = return_dict.get('avg_tps', 0)
+        avg_tps = stats['avg_tps'].value
         
         print("\n--- Final Statistics ---")
         print(f"  System Average Throughput: {avg_tps:.2f} TPS")
@@ -287,8 +567,13 @@ if __name__ == "__main__":
         print("\n--- Storage Stats ---")
         if os.path.exists(WAL_FILE):
             print(f"  WAL Size:        {os.path.getsize(WAL_FILE)/1024:.2f} KB")
+        if os.path.exists(WAL_PREV):
+            print(f"  Prev WAL Size:   {os.path.getsize(WAL_PREV)/1024:.2f} KB (checkpoint in progress)")
         if os.path.exists(CHECKPOINT_FILE):
             print(f"  Checkpoint Size: {os.path.getsize(CHECKPOINT_FILE)/(1024*1024):.2f} MB")
             
+        shm.close()
+        shm.unlink()
+            
         # Run recovery
         recover_system(mem_size)
@@ -1,23 +1,57 @@
 import time
 import multiprocessing
-import random
 import os
+import mmap
 import signal
-import uuid
+import struct
+import itertools
+import array
+import numpy as np
+
+try:
+    from numba import njit  # Optional: compiles the recovery replay loop to machine code
+except ImportError:
+    njit = None
 
 # --- Configuration ---
 MEMORY_SIZE_MB = 128
 TOTAL_RUN_TIME_SEC = 25
 COMMIT_CHANCE = 0.90
+RNG_BATCH = 65536  # Random numbers drawn per refill of the PCG64 buffers
 
 # --- Files ---
 WAL_FILE = 'wal.log'
 
+# --- WAL Record Format (fixed 16-byte binary records, same layout as hybrid.py) ---
+OP_UPDATE, OP_COMMIT, OP_ROLLBACK = 1, 2, 3
+WAL_RECORD = struct.Struct('<BQIBBx')  # op, u8 tx, addr, old, new, padding
+WAL_DTYPE = np.dtype([('op', 'u1'), ('tx', 'u8'), ('addr', 'u4'),
+                      ('old', 'u1'), ('new', 'u1'), ('_pad', 'u1')])  # Same record, for recovery
+
+# --- Recovery Kernel: apply the selected log records in log order (or newest first) ---
+if njit is not None:
+    # One pass over the log with no masked copies, and an explicit application order
+    @njit(cache=True, boundscheck=False)
+    def replay(mem, addrs, vals, selected, reverse):
+        n = addrs.size
+        count = 0
+        for j in range(n):
+            i = n - 1 - j if reverse else j
+            if selected[i]:
+                mem[addrs[i]] = vals[i]
+                count += 1
+        return count
+else:
+    def replay(mem, addrs, vals, selected, reverse):
+        step = -1 if reverse else 1
+        mem[addrs[selected][::step]] = vals[selected][::step]
+        return int(selected.sum())
+
 # --- Global Resources ---
 memory_state = None
 
 # --- Worker Logic ---
-def worker_process(mem_size_bytes, return_dict):
+def worker_process(mem_size_bytes, avg_tps_value):
     global memory_state
     
     memory_state = bytearray(mem_size_bytes)
@@ -33,45 +67,71 @@ def worker_process(mem_size_bytes, return_dict):
     try:
         with open(WAL_FILE, 'ab', buffering=0) as wal_file:
             print(f"[Worker] WAL file opened. Processing transactions...")
+            tx_ids = itertools.count(1)  # Monotonic 64-bit tx ids (single writer, no lock needed)
+            pack_into = WAL_RECORD.pack_into
+            record_size = WAL_RECORD.size
+            # One transaction's records (up to 5 UPDATEs + COMMIT), packed in place into a buffer
+            # allocated once and handed to the kernel in a single write()
+            tx_buf = bytearray(record_size * 6)
+            tx_view = memoryview(tx_buf)
+            # Undo log allocated once and reused: a transaction has at most 5 ops
+            undo_addrs = array.array('I', [0] * 5)
+            undo_olds = array.array('B', [0] * 5)
+            
+            # Random ops pre-generated in batches (as Python ints) and consumed through a cursor
+            rng = np.random.default_rng()
+            cursor = RNG_BATCH  # Forces a refill before the first transaction
             
             while True:
                 # 1. Simulate Transaction (Insert/Update)
-                tx_id = str(uuid.uuid4())[:8]
-                num_ops = random.randint(1, 5)
-                undo_log = []
+                if cursor + 5 > RNG_BATCH:
+                    nop_buf = rng.integers(1, 6, size=RNG_BATCH).tolist()
+                    addr_buf = rng.integers(0, len(memory_state), size=RNG_BATCH).tolist()
+                    val_buf = rng.integers(0, 256, size=RNG_BATCH).tolist()
+                    commit_buf = (rng.random(RNG_BATCH, dtype=np.float32) < COMMIT_CHANCE).tolist()
+                    cursor = 0
+                tx_id = next(tx_ids)
+                num_ops = nop_buf[cursor]
+                commits = commit_buf[cursor]
+                n_undo = 0
                 
                 # Execution Phase: Write to Log + Dirty Memory
-                for _ in range(num_ops):
-                    address = random.randint(0, len(memory_state) - 1)
-                    new_val = random.randint(0, 255)
+                for i in range(cursor, cursor + num_ops):
+                    address = addr_buf[i]
+                    new_val = val_buf[i]
                     old_val = memory_state[address]
                     
-                    undo_log.append((address, old_val))
+                    # Log Entry: Redo and Undo info (buffered until the transaction ends).
+                    # The fate is drawn up front, so a rollback never builds log records
+                    if commits:
+                        pack_into(tx_buf, n_undo * record_size, OP_UPDATE, tx_id, address, old_val, new_val)
                     
-                    # Log Entry: Redo and Undo info
-                    entry = f"UPDATE:{tx_id}:{address}:{old_val}:{new_val}\n".encode('utf-8')
-                    wal_file.write(entry)
+                    undo_addrs[n_undo] = address
+                    undo_olds[n_undo] = old_val
+                    n_undo += 1
                     
-                    # Dirty the Page (Memory)
+                    # Dirty the Page (Memory). Plain bytearray indexing on purpose: a memoryview
+                    # store is slower per byte in CPython, and random addresses never form runs
+                    # that a single slice assignment could cover
                     memory_state[address] = new_val
+                cursor += num_ops
                 
                 # 2. Commit or Rollback
-                if random.random() < COMMIT_CHANCE:
+                if commits:
                     # COMMIT PATH
-                    wal_file.write(f"COMMIT:{tx_id}\n".encode('utf-8'))
-                    # CRITICAL: fsync forces durability. This is the bottleneck.
-                    os.fsync(wal_file.fileno())
+                    pack_into(tx_buf, n_undo * record_size, OP_COMMIT, tx_id, 0, 0, 0)
+                    wal_file.write(tx_view[:(n_undo + 1) * record_size])
+                    # CRITICAL: fdatasync forces durability. This is the bottleneck.
+                    # (Unlike fsync it skips inode timestamps; the size change is still synced.)
+                    os.fdatasync(wal_file.fileno())
                     
                     transaction_count += 1
                     total_tx_lifetime += 1  # [New] Accumulate total successful transactions
                 else:
                     # ROLLBACK PATH
-                    # Active Undo in Memory
-                    for address, old_val in reversed(undo_log):
-                        memory_state[address] = old_val
-                    
-                    wal_file.write(f"ROLLBACK:{tx_id}\n".encode('utf-8'))
-                    os.fsync(wal_file.fileno())
+                    # Active Undo in Memory; no I/O: to recovery, an aborted transaction never happened
+                    for j in range(n_undo - 1, -1, -1):
+                        memory_state[undo_addrs[j]] = undo_olds[j]
                 
                 # 3. Throughput Reporting
                 current_time = time.time()
@@ -80,11 +140,11 @@ def worker_process(mem_size_bytes, return_dict):
                     tps = transaction_count / (current_time - last_report_time)
                     print(f"[Worker] Throughput: {tps:.2f} TPS")
                     
-                    # [New] Calculate and update global average TPS (save to shared dict)
+                    # [New] Calculate and update global average TPS (save to shared Value)
                     total_duration = current_time - start_time_global
                     if total_duration > 0:
                         avg_tps = total_tx_lifetime / total_duration
-                        return_dict['avg_tps'] = avg_tps
+                        avg_tps_value.value = avg_tps
                     
                     transaction_count = 0
                     last_report_time = current_time
@@ -105,58 +165,38 @@ def recover_system(mem_size_bytes):
     
     # 2. Analysis Phase (Scan entire log)
     print(f"[Recovery] Phase 2: Analyzing entire WAL...")
-    tx_status = {}
-    wal_lines = []
+    updates = np.empty(0, dtype=WAL_DTYPE)
+    committed = aborted = np.empty(0, dtype=np.uint64)
     
-    if os.path.exists(WAL_FILE):
-        with open(WAL_FILE, 'rb') as f:
-            for line_bytes in f:
-                wal_lines.append(line_bytes)
-                try:
-                    line = line_bytes.decode('utf-8').strip()
-                    parts = line.split(':')
-                    if parts[0] == "UPDATE":
-                        if parts[1] not in tx_status: tx_status[parts[1]] = "inflight"
-                    elif parts[0] == "COMMIT":
-                        tx_status[parts[1]] = "committed"
-                    elif parts[0] == "ROLLBACK":
-                        tx_status[parts[1]] = "aborted"
-                except: pass
+    # mmap() rejects empty files; an empty WAL simply has nothing to replay
+    if os.path.exists(WAL_FILE) and os.path.getsize(WAL_FILE) > 0:
+        with open(WAL_FILE, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Zero-copy view of the fixed-size records; a torn trailing record is ignored
+            records = np.frombuffer(mm, dtype=WAL_DTYPE, count=len(mm) // WAL_DTYPE.itemsize)
+            ops = records['op']
+            # Boolean indexing copies, so nothing below still points into the mmap
+            updates = records[ops == OP_UPDATE]
+            committed = records['tx'][ops == OP_COMMIT]
+            aborted = records['tx'][ops == OP_ROLLBACK]
+            del records, ops
     
-    inflight = {tx for tx, status in tx_status.items() if status == "inflight"}
+    tx_ids = updates['tx']
+    inflight = np.setdiff1d(tx_ids, np.concatenate([committed, aborted]))
     print(f"[Recovery] Analysis complete. Inflight transactions: {len(inflight)}")
 
-    # 3. Redo Phase (Replay Everything)
+    recovered_np = np.frombuffer(recovered_memory, dtype=np.uint8)
+
+    # 3. Redo Phase (Replay committed history in one vectorized pass; later writes win)
     print("[Recovery] Phase 3: Redo (Replaying History)...")
     redo_start = time.time()
-    redo_count = 0
-    for line_bytes in wal_lines:
-        try:
-            parts = line_bytes.decode('utf-8').strip().split(':')
-            if parts[0] == "UPDATE":
-                # UPDATE:tx_id:addr:old:new
-                addr, new_val = int(parts[2]), int(parts[4])
-                recovered_memory[addr] = new_val
-                redo_count += 1
-        except: pass
+    # Rolled-back updates are skipped: they were undone in memory before the crash
+    replay(recovered_np, updates['addr'], updates['new'], np.isin(tx_ids, committed), False)
     redo_end = time.time()
 
-    # 4. Undo Phase (Revert Inflight)
+    # 4. Undo Phase (Revert Inflight, newest first so the oldest before-image wins)
     print("[Recovery] Phase 4: Undo (Reverting Inflight Data)...")
     undo_start = time.time()
-    undo_count = 0
-    for line_bytes in reversed(wal_lines):
-        if not inflight: break
-        try:
-            parts = line_bytes.decode('utf-8').strip().split(':')
-            if parts[0] == "UPDATE":
-                tx_id = parts[1]
-                if tx_id in inflight:
-                    # Revert to OLD value
-                    addr, old_val = int(parts[2]), int(parts[3])
-                    recovered_memory[addr] = old_val
-                    undo_count += 1
-        except: pass
+    replay(recovered_np, updates['addr'], updates['old'], np.isin(tx_ids, inflight), True)
     undo_end = time.time()
 
     total_end = time.time()
@@ -172,12 +212,11 @@ if __name__ == "__main__":
     print(f"[Manager] Experiment: Model 1 (WAL-Only)")
     mem_size = MEMORY_SIZE_MB * 1024 * 1024
     
-    # [New] Use Manager to receive data from child process
-    manager = multiprocessing.Manager()
-    return_dict = manager.dict()
+    # Shared-memory Value to receive the average TPS (no Manager server process, no IPC)
+    avg_tps_value = multiprocessing.Value('d', 0.0, lock=False)
     
-    # Pass return_dict to worker
-    p = multiprocessing.Process(target=worker_process, args=(mem_size, return_dict))
+    # Pass avg_tps_value to worker
+    p = multiprocessing.Process(target=worker_process, args=(mem_size, avg_tps_value))
     p.start()
     
     try:
@@ -191,7 +230,7 @@ if __name__ == "__main__":
         
         print("\n--- Final Statistics ---")
         # [New] Output Average TPS at the end
-        print(f"  Average Throughput: {return_dict.get('avg_tps', 0):.2f} TPS")
+        print(f"  Average Throughput: {avg_tps_value.value:.2f} TPS")
         
         print("\n--- Storage Stats ---")
         if os.path.exists(WAL_FILE):